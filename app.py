@@ -1,32 +1,59 @@
 import streamlit as st
 import logging
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Optional
+from dataclasses import dataclass, astuple, fields, replace
+from itertools import chain
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-import pint
 
-from sqlalchemy import create_engine, Column, Integer, Float, String, ForeignKey
-from sqlalchemy.orm import sessionmaker, relationship, declarative_base
+# Kernel numérico num módulo importado: o Streamlit reexecuta este script a cada rerun,
+# o que recriaria o dispatcher do Numba (e recarregaria o cache compilado) toda vez
+from calculations import stage_kernel
+
+from sqlalchemy import create_engine, event, Column, Integer, Float, String, ForeignKey
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, declarative_base
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
 # ------------------------------------------------------------------------------
-# Configuração de logger e unidades (Pint)
+# Configuração de logger
 # ------------------------------------------------------------------------------
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ureg = pint.UnitRegistry()
-Q_ = ureg.Quantity
-
 # ------------------------------------------------------------------------------
 # Configuração do banco de dados com SQLAlchemy
 # ------------------------------------------------------------------------------
 DB_PATH = "sqlite:///compressor.db"
 Base = declarative_base()
-engine = create_engine(DB_PATH, echo=False, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    # WAL + synchronous=NORMAL: commits sem fsync duplo e leituras sem bloquear escritas
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")  # ~64 MB de page cache por conexão
+    cursor.execute("PRAGMA mmap_size=268435456")  # leituras via mmap (até 256 MB)
+    cursor.close()
+
+# O Streamlit reexecuta o script a cada rerun; engine e sessões ficam em cache_resource
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    # Pool padrão (uma conexão por sessão em uso): sessões do Streamlit em threads
+    # diferentes não compartilham transações, e o WAL permite leituras concorrentes.
+    # O listener aplica os pragmas a cada conexão nova do pool.
+    engine = create_engine(DB_PATH, echo=False)
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+@st.cache_resource(show_spinner=False)
+def get_sessionmaker(_engine):
+    # Sessão por thread reaproveitada entre reruns do Streamlit
+    return scoped_session(sessionmaker(bind=_engine))
 
 # Modelos ORM simplificados
 class FrameModel(Base):
@@ -40,7 +67,7 @@ class FrameModel(Base):
 class ThrowModel(Base):
     __tablename__ = "throw"
     id = Column(Integer, primary_key=True, index=True)
-    frame_id = Column(Integer, ForeignKey("frame.id"))
+    frame_id = Column(Integer, ForeignKey("frame.id"), index=True)
     throw_number = Column(Integer)
     bore_m = Column(Float)
     clearance_m = Column(Float)
@@ -57,9 +84,17 @@ class ActuatorModel(Base):
     derate_percent = Column(Float)
     air_cooler_fraction = Column(Float)
 
+@st.cache_resource(show_spinner=False)
 def init_db():
+    # Executado uma única vez por processo; reruns reaproveitam o resultado do cache
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    # create_all não acrescenta índices a tabelas que já existiam (bancos anteriores ao índice)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     logger.info("Banco de dados inicializado.")
+    return True
 
 # ------------------------------------------------------------------------------
 # Domínio: Dataclasses para entidades
@@ -70,7 +105,7 @@ class Frame:
     stroke: float  # em metros (SI)
     n_throws: int
 
-@dataclass
+@dataclass(frozen=True)
 class Throw:
     throw_number: int
     bore: float       # metros
@@ -90,110 +125,237 @@ class Actuator:
 class Motor:
     power_kW: float   # Potência do motor (para diagrama)
 
+@dataclass(slots=True)
+class PerfOutput:
+    mass_flow_kg_s: float
+    inlet_pressure_bar: float
+    inlet_temperature_C: float
+    n_stages: int
+    total_shaft_power_kW: float
+    stages: pd.DataFrame              # uma linha por estágio
+    frame_rpm: Optional[float] = None
+
+# ------------------------------------------------------------------------------
+# Persistência da configuração
+# ------------------------------------------------------------------------------
+def save_configuration(frame: Frame, throws: List[Throw], actuator: Actuator) -> int:
+    """
+    Salva frame, throws e atuador numa única transação (um commit por clique).
+    Retorna o id do frame salvo.
+    """
+    Session = get_sessionmaker(get_engine())
+    db = Session()
+    try:
+        # Salvar Frame (flush apenas para obter o id; o commit é único no final)
+        frame_model = FrameModel(rpm=frame.rpm, stroke_m=frame.stroke, n_throws=frame.n_throws)
+        db.add(frame_model)
+        db.flush()
+        frame_id = frame_model.id  # lido antes do commit, que expira o objeto
+        # Salvar todos os Throws num único INSERT (executemany)
+        throws_payload = [
+            {
+                "frame_id": frame_id,
+                "throw_number": t.throw_number,
+                "bore_m": t.bore,
+                "clearance_m": t.clearance,
+                "VVCP": t.VVCP,
+                "SACE": t.SACE,
+                "SAHE": t.SAHE,
+            }
+            for t in throws
+        ]
+        if throws_payload:
+            db.execute(ThrowModel.__table__.insert(), throws_payload)
+        # Salvar Atuador
+        db.execute(ActuatorModel.__table__.insert(), [{
+            "power_available_kW": actuator.power_kW,
+            "derate_percent": actuator.derate_percent,
+            "air_cooler_fraction": actuator.air_cooler_fraction,
+        }])
+        db.commit()
+        return frame_id
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        Session.remove()
+
 # ------------------------------------------------------------------------------
 # Cálculos de performance (inspirado no Ariel 7)
 # ------------------------------------------------------------------------------
-def clamp(n, a, b):
-    return max(a, min(n, b))
+GAMMA = 1.30
+CP = 2.0  # kJ/(kg*K)
+_GAMMA_EXP = (GAMMA - 1.0) / GAMMA  # expoente isentrópico (gamma - 1)/gamma
+
+# Atributos dos throws combinados por estágio, na ordem das linhas do array SoA
+THROW_ATTRS = ("SACE", "VVCP", "SAHE")
+
+def _stage_means(stages: np.ndarray, lens: np.ndarray, throw_idx: np.ndarray, n: int, attrs: np.ndarray) -> np.ndarray:
+    """
+    Média, por estágio, dos atributos dos throws atribuídos.
+    O mapeamento chega achatado: `throw_idx` concatena os throws de cada estágio de `stages`,
+    com `lens` throws por estágio; `attrs` tem uma linha por atributo e uma coluna por
+    throw_number. Todos os segmentos são reduzidos de uma vez com np.add.reduceat.
+    """
+    means = np.zeros((attrs.shape[0], n))
+    nonempty = lens > 0
+    if not nonempty.any():
+        return means
+    
+    sentinel = attrs.shape[1] - 1
+    idx = throw_idx.copy()
+    idx[(idx < 0) | (idx > sentinel)] = sentinel
+    offsets = np.cumsum(lens) - lens
+    sums = np.add.reduceat(attrs[:, idx], offsets[nonempty], axis=1) / lens[nonempty]
+    stages = stages[nonempty]
+    in_range = (stages >= 1) & (stages <= n)
+    means[:, stages[in_range] - 1] = sums[:, in_range]
+    return means
 
 def perform_performance_calculation(
     mass_flow: float,
-    inlet_pressure: Q_,
-    inlet_temperature: Q_,
+    inlet_pressure_pa: float,
+    inlet_temperature_k: float,
     n_stages: int,
     PR_total: float,
     throws: List[Throw],
     stage_mapping: Dict[int, List[int]],  # Agora, cada estágio pode ter mais de um throw
     actuator: Actuator,
-) -> Dict:
+) -> PerfOutput:
     """
     Calcula outputs de performance para cada estágio.
-    Entradas em SI e a combinação dos parâmetros dos throws atribuídos é feita via média.
+    Entradas em SI (floats em Pa e K, já convertidos na interface) e a combinação dos
+    parâmetros dos throws atribuídos é feita via média.
+    Throws e mapeamento seguem ao cache como arrays NumPy: o st.cache_data os hasheia pelos
+    bytes, bem mais barato que percorrer dataclasses e tuplas aninhadas a cada rerun.
     """
+    # Uma linha por throw: throw_number seguido dos atributos de THROW_ATTRS
+    throw_table = np.array(
+        [(t.throw_number, *(getattr(t, name) for name in THROW_ATTRS)) for t in throws], dtype=np.float64
+    ).reshape(len(throws), 1 + len(THROW_ATTRS))
+    # Mapeamento achatado: estágios, quantidade de throws de cada um e os throws concatenados
+    stages = sorted(stage_mapping)
+    stage_lens = np.fromiter((len(stage_mapping[stage]) for stage in stages), dtype=np.int64, count=len(stages))
+    return _perform_perf_cached(
+        mass_flow,
+        inlet_pressure_pa,
+        inlet_temperature_k,
+        n_stages,
+        PR_total,
+        throw_table,
+        np.fromiter(stages, dtype=np.int64, count=len(stages)),
+        stage_lens,
+        np.fromiter(chain.from_iterable(stage_mapping[stage] for stage in stages), dtype=np.int64, count=int(stage_lens.sum())),
+        astuple(actuator),
+    )
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _perform_perf_cached(
+    mass_flow: float,
+    P_in_pa: float,
+    T_in_K: float,
+    n_stages: int,
+    PR_total: float,
+    throw_table: np.ndarray,
+    mapping_stages: np.ndarray,
+    mapping_lens: np.ndarray,
+    mapping_throws: np.ndarray,
+    actuator_tuple: tuple,
+) -> PerfOutput:
     m_dot = mass_flow  # kg/s
-    P_in = inlet_pressure.to(ureg.Pa).magnitude
-    T_in = inlet_temperature.to(ureg.K).magnitude
+    P_in = P_in_pa
+    T_in = T_in_K
 
-    n = max(n_stages, 1)
+    n = int(n_stages)  # o widget garante n_stages >= 1
     PR_base = PR_total ** (1.0 / n)
     
-    gamma = 1.30
-    cp = 2.0  # kJ/(kg*K)
-    
-    stage_details = []
-    total_W_kW = 0.0
+    if throw_table.size and mapping_throws.size:
+        # Throws em arrays paralelos (SoA) indexados por throw_number, uma linha por
+        # atributo de THROW_ATTRS. A última coluna fica em 0.0 e recebe throws atribuídos
+        # mas inexistentes, preservando a média por len(assigned)
+        throw_numbers = throw_table[:, 0].astype(np.int64)
+        attrs = np.zeros((len(THROW_ATTRS), int(throw_numbers.max()) + 2))
+        attrs[:, throw_numbers] = throw_table[:, 1:].T
+        SACE_avg, VVCP_avg, SAHE_avg = _stage_means(mapping_stages, mapping_lens, mapping_throws, n, attrs)
+    else:
+        # Sem throws atribuídos (ex.: aba Processo): médias nulas, eta = 0.65 em todos os estágios
+        SACE_avg = VVCP_avg = SAHE_avg = np.zeros(n)
     
-    # Cria um dicionário para acesso rápido: chave = throw_number, valor = Throw
-    throws_by_number = {t.throw_number: t for t in throws}
+    P_in_arr, P_out_arr, T_out_arr, eta_isent, W_stage, total_W_kW = stage_kernel(
+        m_dot, P_in, T_in, PR_base, n, SACE_avg, VVCP_avg, SAHE_avg, _GAMMA_EXP, CP
+    )
+    T_in_arr = np.concatenate(([T_in], T_out_arr[:-1]))
+    total_W_kW = float(total_W_kW)
     
-    for stage in range(1, n + 1):
-        # Entrada e saída do estágio
-        P_in_stage = P_in * (PR_base ** (stage - 1))
-        P_out_stage = P_in_stage * PR_base
-        
-        # Obter os throws atribuídos (lista de IDs) e combinar parâmetros (média)
-        assigned = stage_mapping.get(stage, [])
-        if assigned:
-            SACE_avg = sum(throws_by_number[t].SACE for t in assigned if t in throws_by_number) / len(assigned)
-            VVCP_avg = sum(throws_by_number[t].VVCP for t in assigned if t in throws_by_number) / len(assigned)
-            SAHE_avg = sum(throws_by_number[t].SAHE for t in assigned if t in throws_by_number) / len(assigned)
-        else:
-            SACE_avg = VVCP_avg = SAHE_avg = 0.0
-        
-        # Eficiência isentrópica influenciada pelos parâmetros (média)
-        eta_isent = 0.65 + 0.15 * (SACE_avg / 100.0) - 0.05 * (VVCP_avg / 100.0) + 0.10 * (SAHE_avg / 100.0)
-        eta_isent = clamp(eta_isent, 0.65, 0.92)
-        
-        # Cálculo isentrópico e real
-        T_out_isent = T_in * (PR_base ** ((gamma - 1.0) / gamma))
-        T_out_actual = T_in + (T_out_isent - T_in) / max(eta_isent, 1e-6)
-        delta_T = T_out_actual - T_in
-        
-        W_stage = m_dot * cp * delta_T / 1000.0   # kW
-        total_W_kW += W_stage
-        
-        stage_details.append({
-            "stage": stage,
-            "P_in_bar": P_in_stage / 1e5,
-            "P_out_bar": P_out_stage / 1e5,
-            "PR": PR_base,
-            "T_in_C": T_in - 273.15,
-            "T_out_C": T_out_actual - 273.15,
-            "isentropic_efficiency": eta_isent,
-            "shaft_power_kW": W_stage,
-            "shaft_power_BHP": W_stage * 1.34102  # conversão: 1 kW ≈ 1.34102 BHP
-        })
-        
-        # Para próximo estágio, a saída atual vira a entrada
-        T_in = T_out_actual
+    # Tabela por estágio montada por colunas e exibida diretamente com st.dataframe
+    stage_details_df = pd.DataFrame({
+        "stage": np.arange(1, n + 1),
+        "P_in_bar": P_in_arr / 1e5,
+        "P_out_bar": P_out_arr / 1e5,
+        "PR": np.full(n, PR_base),
+        "T_in_C": T_in_arr - 273.15,
+        "T_out_C": T_out_arr - 273.15,
+        "isentropic_efficiency": eta_isent,
+        "shaft_power_kW": W_stage,
+    })
     
-    outputs = {
-        "mass_flow_kg_s": m_dot,
-        "inlet_pressure_bar": P_in / 1e5,
-        "inlet_temperature_C": inlet_temperature.to(ureg.degC).magnitude,
-        "n_stages": n_stages,
-        "total_shaft_power_kW": total_W_kW,
-        "total_shaft_power_BHP": total_W_kW * 1.34102,
-        "stage_details": stage_details,
-        "a_Ariel7_compatible": {
-            "stages": stage_details,
-            "total_shaft_power_kW": total_W_kW,
-            "total_shaft_power_BHP": total_W_kW * 1.34102,
-        }
+    # Estrutura única; vistas em BHP são derivadas apenas na exibição (show_outputs)
+    return PerfOutput(
+        mass_flow_kg_s=m_dot,
+        inlet_pressure_bar=P_in / 1e5,
+        inlet_temperature_C=T_in_K - 273.15,
+        n_stages=n_stages,
+        total_shaft_power_kW=total_W_kW,
+        stages=stage_details_df,
+    )
+
+def show_outputs(outputs: PerfOutput):
+    """
+    Exibe o resumo do cálculo em JSON e a tabela por estágio, acrescentando as
+    potências em BHP (1 kW ≈ 1.34102 BHP) só no momento da exibição.
+    """
+    summary = {
+        f.name: getattr(outputs, f.name)
+        for f in fields(outputs)
+        if f.name != "stages" and getattr(outputs, f.name) is not None
     }
-    return outputs
+    summary["total_shaft_power_BHP"] = outputs.total_shaft_power_kW * 1.34102
+    st.json(summary)
+    st.dataframe(outputs.stages.assign(shaft_power_BHP=lambda d: d.shaft_power_kW * 1.34102))
 
 # ------------------------------------------------------------------------------
 # Diagrama interativo com Plotly: Motor, Frame e Throws (estilo Ariel7)
 # ------------------------------------------------------------------------------
-def generate_diagram(frame: Frame, throws: List[Throw], actuator: Actuator, motor: Motor) -> go.Figure:
+def generate_diagram(frame: Frame, throws: List[Throw], actuator: Actuator, motor: Motor) -> "go.Figure":
     """
     Monta um diagrama representando:
       - O motor (à esquerda) com potência em BHP;
       - O frame do compressor (no centro);
       - Os throws abaixo do frame (podem ser mais de um estágio, mas aqui exibimos todos os throws cadastrados).
+    A figura é cacheada pelo conteúdo dos dataclasses, evitando reconstruí-la em reruns sem alteração.
     """
-    fig = go.Figure()
+    return _build_diagram(
+        astuple(frame),
+        tuple(astuple(t) for t in throws),
+        astuple(actuator),
+        astuple(motor),
+    )
+
+# cache_resource devolve o mesmo objeto sem pickle: com cache_data cada acerto desserializava
+# o Figure, revalidando-o no Plotly, e saía mais caro que reconstruí-lo. O Figure não é
+# alterado depois de montado, então pode ser compartilhado entre sessões
+@st.cache_resource(ttl=3600, max_entries=32, show_spinner=False)
+def _build_diagram(frame_tuple: tuple, throws_tuple: Tuple[tuple, ...], actuator_tuple: tuple, motor_tuple: tuple) -> "go.Figure":
+    import plotly.graph_objects as go  # sob demanda: a aba Processo não usa o diagrama
+    
+    frame = Frame(*frame_tuple)
+    throws = [Throw(*t) for t in throws_tuple]
+    actuator = Actuator(*actuator_tuple)
+    motor = Motor(*motor_tuple)
+    
+    # Shapes e anotações são acumulados em listas e entregues ao Figure de uma só vez
+    shapes = []
+    annotations = []
     
     canvas_width = 900
     canvas_height = 350
@@ -203,35 +365,35 @@ def generate_diagram(frame: Frame, throws: List[Throw], actuator: Actuator, moto
     motor_y = canvas_height / 2 - 25
     motor_width = 100
     motor_height = 50
-    fig.add_shape(
+    shapes.append(dict(
         type="rect",
         x0=motor_x, y0=motor_y,
         x1=motor_x+motor_width, y1=motor_y+motor_height,
         line=dict(color="MediumPurple"),
         fillcolor="Lavender"
-    )
-    fig.add_annotation(
+    ))
+    annotations.append(dict(
         x=motor_x+motor_width/2, y=motor_y+motor_height/2,
         text=f"Motor<br>{motor.power_kW*1.34102:.0f} BHP", 
         showarrow=False, font=dict(size=12), align="center"
-    )
+    ))
     
     # Posição do frame (centralizado)
     frame_x = motor_x + motor_width + 50
     frame_y = canvas_height / 2 - 25
     frame_width = 200
     frame_height = 50
-    fig.add_shape(
+    shapes.append(dict(
         type="rect",
         x0=frame_x, y0=frame_y,
         x1=frame_x+frame_width, y1=frame_y+frame_height,
         line=dict(color="RoyalBlue"),
         fillcolor="LightSkyBlue"
-    )
-    fig.add_annotation(
+    ))
+    annotations.append(dict(
         x=frame_x+frame_width/2, y=frame_y+frame_height/2,
         text=f"Frame<br>RPM: {frame.rpm:.0f}", showarrow=False, font=dict(size=12), align="center"
-    )
+    ))
     
     # Distribuição dos throws abaixo do frame
     n = len(throws)
@@ -239,47 +401,193 @@ def generate_diagram(frame: Frame, throws: List[Throw], actuator: Actuator, moto
         throw_spacing = frame_width / n
     else:
         throw_spacing = 0
+    throw_y = frame_y + frame_height + 20
+    throw_width = throw_spacing/2
+    throw_height = 30
     for t in throws:
         idx = t.throw_number - 1
         throw_x = frame_x + idx * throw_spacing + throw_spacing/4
-        throw_y = frame_y + frame_height + 20
-        throw_width = throw_spacing/2
-        throw_height = 30
-        fig.add_shape(
+        shapes.append(dict(
             type="rect",
             x0=throw_x, y0=throw_y,
             x1=throw_x+throw_width, y1=throw_y+throw_height,
             line=dict(color="DarkOrange"),
             fillcolor="Moccasin"
-        )
-        fig.add_annotation(
+        ))
+        annotations.append(dict(
             x=throw_x+throw_width/2, y=throw_y+throw_height/2,
             text=f"Throw {t.throw_number}", showarrow=False, font=dict(size=10)
-        )
+        ))
     
     # Representa o atuador (acionador) à direita do frame
     actuator_x = frame_x + frame_width + 50
     actuator_y = canvas_height / 2 - 20
-    fig.add_shape(
+    shapes.append(dict(
         type="rect",
         x0=actuator_x, y0=actuator_y,
         x1=actuator_x+120, y1=actuator_y+60,
         line=dict(color="SaddleBrown"),
         fillcolor="PeachPuff"
-    )
-    fig.add_annotation(
+    ))
+    annotations.append(dict(
         x=actuator_x+60, y=actuator_y+30,
         text=f"Acionador<br>{actuator.power_kW:.0f} kW", showarrow=False, font=dict(size=12), align="center"
-    )
+    ))
     
-    fig.update_layout(
+    return go.Figure(layout=dict(
+        shapes=shapes,
+        annotations=annotations,
         width=canvas_width,
         height=canvas_height,
         margin=dict(l=20, r=20, t=20, b=20),
         xaxis=dict(visible=False),
         yaxis=dict(visible=False)
+    ))
+
+# ------------------------------------------------------------------------------
+# Aba de configuração do equipamento
+# ------------------------------------------------------------------------------
+# Valores iniciais (SI) de cada throw novo na tabela de throws
+THROW_DEFAULTS = {"bore": 0.08, "clearance": 0.002, "VVCP": 90.0, "SACE": 80.0, "SAHE": 60.0}
+
+def _resize_throws(throws_df: Optional[pd.DataFrame], n_throws: int) -> pd.DataFrame:
+    """
+    Ajusta a tabela de throws (em SI) para n_throws linhas por reindexação: throws já
+    editados são preservados e os novos recebem THROW_DEFAULTS.
+    """
+    index = pd.RangeIndex(1, n_throws + 1, name="throw_number")
+    if throws_df is None:
+        return pd.DataFrame(THROW_DEFAULTS, index=index).reset_index()
+    return throws_df.set_index("throw_number").reindex(index).fillna(THROW_DEFAULTS).reset_index()
+
+@st.fragment
+def equipment_tab(n_stages: int, is_si: bool):
+    """
+    Frame, throws, mapeamento de estágios, atuador, motor e diagrama.
+    Como fragmento, editar estes widgets reexecuta apenas esta função, não o script inteiro;
+    mudanças de n_stages (aba Processo) e de unidades disparam o rerun completo.
+    """
+    st.header("Configuração do Equipamento")
+    st.subheader("Frame, Throws e Mapeamento de Estágios")
+    # Inputs do Frame
+    frame_rpm = st.number_input("RPM do Frame", min_value=100, max_value=3000, value=900, step=10)
+    if is_si:
+        stroke_input = st.number_input("Stroke do Frame (m)", min_value=0.01, max_value=1.0, value=0.12, step=0.01)
+    else:
+        stroke_input = st.number_input("Stroke do Frame (mm)", min_value=10, max_value=1000, value=120, step=1)
+    n_throws = st.number_input("Número de Throws", min_value=1, max_value=20, value=3, step=1)
+    if is_si:
+        stroke_si = stroke_input
+    else:
+        stroke_si = stroke_input / 1000.0
+    
+    current_frame = Frame(rpm=frame_rpm, stroke=stroke_si, n_throws=n_throws)
+    
+    st.subheader("Parâmetros dos Throws")
+    # Uma única tabela editável no lugar de 5 widgets por throw. A tabela editada fica em
+    # session_state (em SI) e é só redimensionada quando n_throws muda, para que as edições
+    # sobrevivam à troca de tamanho ou de unidades (que recriam o data_editor)
+    throws_df = _resize_throws(st.session_state.get("throws_df"), int(n_throws))
+    if is_si:
+        length_unit, length_scale = "m", 1.0
+        bore_range = dict(min_value=0.01, max_value=0.2, step=0.001)
+        clearance_range = dict(min_value=0.0005, max_value=0.01, step=0.0005)
+    else:
+        length_unit, length_scale = "mm", 1000.0
+        bore_range = dict(min_value=10, max_value=400, step=1)
+        clearance_range = dict(min_value=0, max_value=20, step=1)
+    edited_throws = st.data_editor(
+        throws_df.assign(bore=throws_df["bore"] * length_scale, clearance=throws_df["clearance"] * length_scale),
+        num_rows="fixed",
+        hide_index=True,
+        key=f"throws_editor_{length_unit}",  # edições em m e mm não se misturam
+        column_config={
+            "throw_number": st.column_config.NumberColumn("Throw", disabled=True),
+            "bore": st.column_config.NumberColumn(f"Bore ({length_unit})", required=True, **bore_range),
+            "clearance": st.column_config.NumberColumn(f"Clearance ({length_unit})", required=True, **clearance_range),
+            "VVCP": st.column_config.NumberColumn("VVCP (%)", min_value=0, max_value=100, step=1, required=True),
+            "SACE": st.column_config.NumberColumn("SACE (%)", min_value=0, max_value=100, step=1, required=True),
+            "SAHE": st.column_config.NumberColumn("SAHE (%)", min_value=0, max_value=100, step=1, required=True),
+        },
+    )
+    edited_throws[["bore", "clearance"]] = edited_throws[["bore", "clearance"]] / length_scale
+    st.session_state["throws_df"] = edited_throws
+    # Colunas na mesma ordem dos campos de Throw: reidratação posicional sem dict por linha
+    throws_list = [Throw(*row) for row in edited_throws.itertuples(index=False, name=None)]
+    
+    st.subheader("Mapeamento de Estágios para Throws")
+    # Permite selecionar mais de um throw para cada estágio (uma coluna de checkbox por throw).
+    # Como nos throws, a seleção editada é guardada e apenas reindexada quando estágios ou throws mudam
+    throw_labels = [f"Throw {t.throw_number}" for t in throws_list]
+    mapping_df = st.session_state.get("mapping_df", pd.DataFrame(dtype=bool)).reindex(
+        index=pd.RangeIndex(1, int(n_stages)+1, name="Estágio"), columns=throw_labels, fill_value=False
+    )
+    edited_mapping = st.data_editor(
+        mapping_df,
+        num_rows="fixed",
+        key="stage_mapping_editor",
+        column_config={label: st.column_config.CheckboxColumn(label) for label in throw_labels},
+    )
+    st.session_state["mapping_df"] = edited_mapping
+    checked_stage, checked_throw = np.nonzero(edited_mapping.to_numpy(dtype=bool))
+    checked_stage = edited_mapping.index.to_numpy()[checked_stage].tolist()
+    checked_throw = np.array([t.throw_number for t in throws_list])[checked_throw].tolist()
+    stage_mapping: Dict[int, List[int]] = {}
+    for stage, throw_number in zip(checked_stage, checked_throw):
+        stage_mapping.setdefault(stage, []).append(throw_number)
+    
+    st.subheader("Parâmetros do Atuador")
+    power_kW = st.number_input("Potência do Acionador (kW)", value=250.0, min_value=0.0, step=1.0)
+    derate_pct = st.number_input("Derate (%)", value=5.0, min_value=0.0, max_value=100.0, step=0.5)
+    air_cooler_frac = st.number_input("Air Cooler (%)", value=25.0, min_value=0.0, max_value=100.0, step=0.5)
+    current_actuator = Actuator(power_kW=power_kW, derate_percent=derate_pct, air_cooler_fraction=air_cooler_frac)
+    
+    st.subheader("Parâmetros do Motor")
+    # O motor aqui representa a fonte de potência, normalmente com potência em kW, convertida para BHP para diagrama
+    motor_power_kW = st.number_input("Potência do Motor (kW)", value=300.0, min_value=0.0, step=1.0)
+    current_motor = Motor(power_kW=motor_power_kW)
+    
+    st.markdown("---")
+    st.subheader("Diagrama do Equipamento")
+    fig_diagram = generate_diagram(current_frame, throws_list, current_actuator, current_motor)
+    st.plotly_chart(fig_diagram, use_container_width=True)
+    
+    st.markdown("---")
+    st.subheader("Salvar Configuração e Calcular Performance")
+    # Chave da configuração atual: os outputs guardados só valem enquanto ela não mudar.
+    # Só tuplas simples: cada rerun redefine as classes, e dataclasses de reruns
+    # diferentes nunca são iguais entre si
+    config_key = (
+        astuple(current_frame),
+        tuple(astuple(t) for t in throws_list),
+        tuple(sorted((k, tuple(v)) for k, v in stage_mapping.items())),
+        astuple(current_actuator),
+        n_stages,
     )
-    return fig
+    if st.button("Salvar Configuração e Calcular Outputs"):
+        save_configuration(current_frame, throws_list, current_actuator)
+        
+        # Exemplo de cálculo de performance com dados do processo fixos
+        calc_outputs = perform_performance_calculation(
+            mass_flow=12.0,
+            inlet_pressure_pa=6000000.0,  # 60 bar
+            inlet_temperature_k=298.15,
+            n_stages=n_stages,
+            PR_total=2.5,
+            throws=throws_list,
+            stage_mapping=stage_mapping,
+            actuator=current_actuator
+        )
+        st.session_state["equipment_outputs"] = (config_key, replace(calc_outputs, frame_rpm=frame_rpm))
+        st.success("Configuração salva e outputs calculados:")
+    # Os últimos outputs ficam visíveis nos reruns seguintes sem regravar no DB nem recalcular,
+    # desde que a configuração acima continue a mesma do cálculo
+    if "equipment_outputs" in st.session_state:
+        saved_key, saved_outputs = st.session_state["equipment_outputs"]
+        if saved_key == config_key:
+            show_outputs(saved_outputs)
+        else:
+            st.caption("A configuração mudou desde o último cálculo; salve novamente para atualizar os outputs.")
 
 # ------------------------------------------------------------------------------
 # Interface do usuário com Streamlit
@@ -301,157 +609,71 @@ def main():
         st.session_state["unit_system"] = unit
         if st.button("Resetar DB"):
             import os
-            if os.path.exists("compressor.db"):
-                os.remove("compressor.db")
+            # Fecha as conexões do pool antes de apagar o arquivo (e os arquivos do WAL)
+            get_engine().dispose()
+            for path in ("compressor.db", "compressor.db-wal", "compressor.db-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+            init_db.clear()
             init_db()
+            st.session_state.pop("equipment_outputs", None)
             st.success("Banco de dados reinicializado.")
     
+    # Sistema de unidades lido uma única vez por rerun
+    unit_system = st.session_state["unit_system"]
+    is_si = unit_system == "SI"
+    
     tabs = st.tabs(["Processo", "Configuração do Equipamento"])
     
     # --- Aba PROCESSO ---
     with tabs[0]:
         st.header("Processo")
         st.subheader("Condições de Processo")
-        if st.session_state["unit_system"] == "SI":
-            inlet_pressure = st.number_input("Pressão de sucção (Pa)", value=200000.0, step=1000.0)
-            inlet_temperature = st.number_input("Temperatura de entrada (K)", value=298.15, step=1.0)
-        else:
-            inlet_pressure_bar = st.number_input("Pressão de sucção (bar)", value=2.0, step=0.01)
-            inlet_temperature_C = st.number_input("Temperatura de entrada (°C)", value=25.0, step=1.0)
-            inlet_pressure = inlet_pressure_bar * 1e5
-            inlet_temperature = inlet_temperature_C + 273.15
-        
-        mass_flow = st.number_input("Massa de Gás (kg/s)", value=12.0, step=0.1)
+        # Fora do form: o número de estágios também dimensiona o mapeamento da aba de
+        # equipamento e precisa valer lá sem exigir o submit do cálculo de processo
         n_stages = st.number_input("Número de estágios", min_value=1, max_value=12, value=3, step=1)
-        PR_total = st.number_input("Razão de compressão total (PR)", min_value=1.0, max_value=100.0, value=2.5, step=0.1)
-        
-        st.subheader("Calcular Performance")
-        if st.button("Calcular outputs (Processo)"):
+        # O form só dispara rerun no submit, não a cada alteração de campo
+        with st.form("entrada_form"):
+            if is_si:
+                inlet_pressure = st.number_input("Pressão de sucção (Pa)", value=200000.0, step=1000.0)
+                inlet_temperature = st.number_input("Temperatura de entrada (K)", value=298.15, step=1.0)
+            else:
+                inlet_pressure_bar = st.number_input("Pressão de sucção (bar)", value=2.0, step=0.01)
+                inlet_temperature_C = st.number_input("Temperatura de entrada (°C)", value=25.0, step=1.0)
+                inlet_pressure = inlet_pressure_bar * 1e5
+                inlet_temperature = inlet_temperature_C + 273.15
+            
+            mass_flow = st.number_input("Massa de Gás (kg/s)", value=12.0, step=0.1)
+            PR_total = st.number_input("Razão de compressão total (PR)", min_value=1.0, max_value=100.0, value=2.5, step=0.1)
+            
+            st.subheader("Calcular Performance")
+            submitted = st.form_submit_button("Calcular outputs (Processo)")
+        # Chave das entradas do cálculo (os campos do form só mudam no submit; n_stages fica fora dele)
+        process_key = (mass_flow, inlet_pressure, inlet_temperature, int(n_stages), PR_total)
+        if submitted:
             # Para cálculo completo, os throws e mapeamento deverão ser configurados na aba de equipamento.
-            calc_outputs = perform_performance_calculation(
+            st.session_state["process_outputs"] = (process_key, perform_performance_calculation(
                 mass_flow=mass_flow,
-                inlet_pressure=Q_(inlet_pressure, ureg.Pa),
-                inlet_temperature=Q_(inlet_temperature, ureg.K),
+                inlet_pressure_pa=inlet_pressure,
+                inlet_temperature_k=inlet_temperature,
                 n_stages=n_stages,
                 PR_total=PR_total,
                 throws=[],           # vazia neste caso
                 stage_mapping={},
                 actuator=Actuator(power_kW=0, derate_percent=0, air_cooler_fraction=0)
-            )
-            st.json(calc_outputs)
+            ))
+        # Mantém o último resultado entre reruns disparados por outros widgets, enquanto as
+        # entradas forem as mesmas do cálculo
+        if "process_outputs" in st.session_state:
+            saved_key, saved_outputs = st.session_state["process_outputs"]
+            if saved_key == process_key:
+                show_outputs(saved_outputs)
+            else:
+                st.caption("As entradas mudaram desde o último cálculo; calcule novamente para atualizar os outputs.")
     
     # --- Aba CONFIGURAÇÃO DO EQUIPAMENTO ---
     with tabs[1]:
-        st.header("Configuração do Equipamento")
-        st.subheader("Frame, Throws e Mapeamento de Estágios")
-        # Inputs do Frame
-        frame_rpm = st.number_input("RPM do Frame", min_value=100, max_value=3000, value=900, step=10)
-        if st.session_state["unit_system"] == "SI":
-            stroke_input = st.number_input("Stroke do Frame (m)", min_value=0.01, max_value=1.0, value=0.12, step=0.01)
-        else:
-            stroke_input = st.number_input("Stroke do Frame (mm)", min_value=10, max_value=1000, value=120, step=1)
-        n_throws = st.number_input("Número de Throws", min_value=1, max_value=20, value=3, step=1)
-        if st.session_state["unit_system"] == "Metric":
-            stroke_si = stroke_input / 1000.0
-        else:
-            stroke_si = stroke_input
-        
-        current_frame = Frame(rpm=frame_rpm, stroke=stroke_si, n_throws=n_throws)
-        
-        st.subheader("Parâmetros dos Throws")
-        throws_list = []
-        for i in range(1, int(n_throws)+1):
-            st.markdown(f"**Throw {i}**")
-            if st.session_state["unit_system"] == "SI":
-                bore = st.number_input(f"Throw {i} - Bore (m)", value=0.08, min_value=0.01, max_value=0.2, step=0.001, key=f"throw{i}_bore")
-                clearance = st.number_input(f"Throw {i} - Clearance (m)", value=0.002, min_value=0.0005, max_value=0.01, step=0.0005, key=f"throw{i}_clearance")
-            else:
-                bore_mm = st.number_input(f"Throw {i} - Bore (mm)", value=80, min_value=10, max_value=400, step=1, key=f"throw{i}_bore")
-                clearance_mm = st.number_input(f"Throw {i} - Clearance (mm)", value=2, min_value=0, max_value=20, step=1, key=f"throw{i}_clearance")
-                bore = bore_mm / 1000.0
-                clearance = clearance_mm / 1000.0
-            VVCP = st.number_input(f"Throw {i} - VVCP (%)", value=90, min_value=0, max_value=100, step=1, key=f"throw{i}_VVCP")
-            SACE = st.number_input(f"Throw {i} - SACE (%)", value=80, min_value=0, max_value=100, step=1, key=f"throw{i}_SACE")
-            SAHE = st.number_input(f"Throw {i} - SAHE (%)", value=60, min_value=0, max_value=100, step=1, key=f"throw{i}_SAHE")
-            throws_list.append(Throw(throw_number=i, bore=bore, clearance=clearance, VVCP=VVCP, SACE=SACE, SAHE=SAHE))
-        
-        st.subheader("Mapeamento de Estágios para Throws")
-        # Permite selecionar mais de um throw para cada estágio
-        stage_mapping = {}
-        for s in range(1, int(n_stages)+1):
-            options = [f"Throw {t.throw_number}" for t in throws_list]
-            selected = st.multiselect(f"Estágio {s} recebe:", options=options, key=f"stage_map_{s}")
-            # Extrai os números dos throws selecionados
-            selected_ids = []
-            for sel in selected:
-                try:
-                    num = int(sel.split(" ")[1])
-                    selected_ids.append(num)
-                except Exception:
-                    pass
-            stage_mapping[s] = selected_ids
-        
-        st.subheader("Parâmetros do Atuador")
-        power_kW = st.number_input("Potência do Acionador (kW)", value=250.0, min_value=0.0, step=1.0)
-        derate_pct = st.number_input("Derate (%)", value=5.0, min_value=0.0, max_value=100.0, step=0.5)
-        air_cooler_frac = st.number_input("Air Cooler (%)", value=25.0, min_value=0.0, max_value=100.0, step=0.5)
-        current_actuator = Actuator(power_kW=power_kW, derate_percent=derate_pct, air_cooler_fraction=air_cooler_frac)
-        
-        st.subheader("Parâmetros do Motor")
-        # O motor aqui representa a fonte de potência, normalmente com potência em kW, convertida para BHP para diagrama
-        motor_power_kW = st.number_input("Potência do Motor (kW)", value=300.0, min_value=0.0, step=1.0)
-        current_motor = Motor(power_kW=motor_power_kW)
-        
-        st.markdown("---")
-        st.subheader("Diagrama do Equipamento")
-        fig_diagram = generate_diagram(current_frame, throws_list, current_actuator, current_motor)
-        st.plotly_chart(fig_diagram, use_container_width=True)
-        
-        st.markdown("---")
-        st.subheader("Salvar Configuração e Calcular Performance")
-        if st.button("Salvar Configuração e Calcular Outputs"):
-            db = SessionLocal()
-            # Salvar Frame
-            frame_model = FrameModel(rpm=frame_rpm, stroke_m=stroke_si, n_throws=n_throws)
-            db.add(frame_model)
-            db.commit()
-            db.refresh(frame_model)
-            # Salvar cada Throw
-            for t in throws_list:
-                throw_model = ThrowModel(
-                    frame_id=frame_model.id,
-                    throw_number=t.throw_number,
-                    bore_m=t.bore,
-                    clearance_m=t.clearance,
-                    VVCP=t.VVCP,
-                    SACE=t.SACE,
-                    SAHE=t.SAHE
-                )
-                db.add(throw_model)
-            # Salvar Atuador
-            actuator_model = ActuatorModel(
-                power_available_kW=power_kW,
-                derate_percent=derate_pct,
-                air_cooler_fraction=air_cooler_frac
-            )
-            db.add(actuator_model)
-            db.commit()
-            db.close()
-            
-            # Exemplo de cálculo de performance com dados do processo fixos
-            calc_outputs = perform_performance_calculation(
-                mass_flow=12.0,
-                inlet_pressure=Q_(6000000, ureg.Pa),  # 60 bar
-                inlet_temperature=Q_(298.15, ureg.K),
-                n_stages=n_stages,
-                PR_total=2.5,
-                throws=throws_list,
-                stage_mapping=stage_mapping,
-                actuator=current_actuator
-            )
-            calc_outputs["frame_rpm"] = frame_rpm
-            st.success("Configuração salva e outputs calculados:")
-            st.json(calc_outputs)
+        equipment_tab(int(n_stages), is_si)
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,19 @@
 
+_HP_PER_KW = 1.34102
+_KW_PER_HP = 1.0 / _HP_PER_KW
+
+_POWER_FACTORS = {('kW', 'HP'): _HP_PER_KW, ('HP', 'kW'): _KW_PER_HP}
+_FLOW_FACTORS = {('m3/h', 'E3m3/d'): 24 / 1000, ('m3/h', 'MMSCFD'): 0.000588577}
+
 def converter_potencia(valor, de='kW', para='HP'):
-    if de == 'kW' and para == 'HP':
-        return valor * 1.34102
-    elif de == 'HP' and para == 'kW':
-        return valor / 1.34102
-    else:
-        return valor
+    factor = _POWER_FACTORS.get((de, para))
+    return valor if factor is None else valor * factor
 
 def converter_vazao(valor, de='m3/h', para='MMSCFD'):
-    if de == 'm3/h' and para == 'E3m3/d':
-        return valor * 24 / 1000
-    elif de == 'm3/h' and para == 'MMSCFD':
-        return valor * 0.000588577
-    else:
-        return valor
+    factor = _FLOW_FACTORS.get((de, para))
+    return valor if factor is None else valor * factor
+
+def converter_potencia_series(serie, de='kW', para='HP'):
+    # Conversão de uma coluna inteira de uma vez (evita .apply por linha)
+    factor = _POWER_FACTORS.get((de, para))
+    return serie if factor is None else serie.mul(factor)